@@ -6,9 +6,40 @@ Edited 02/27/2023 by Jacob Sage Vietorisz for Stein Biological Physics Lab, Brow
 
   
 # Import necessary libraries
+from functools import lru_cache
+
 import numpy as np
 
 
+@lru_cache(maxsize=32)
+def _scan_indices(Nx, Ny):
+    '''
+    Memoized serpentine index pattern for an (Nx+1) x (Ny+1) scan.
+    Parameter sweeps call get_voltage_array repeatedly with the same grid
+    shape; caching skips recomputing the identical index pattern.
+
+    :params:
+    :Nx: Int value. Number of scan columns minus one.
+    :Ny: Int value. Number of discrete Y voltages per column minus one.
+
+    :returns:
+    :col: 1D int32 array (read-only). Column index of each scan point.
+    :serp: 1D int32 array (read-only). Serpentine row index of each scan point.
+    '''
+    # Flat scan index; all pattern math stays in int32 until the final cast
+    i = np.arange((Nx+1)*(Ny+1), dtype=np.int32)
+    col = i // (Ny+1)
+    row_in_col = i % (Ny+1)
+
+    # Serpentine Y indexing: even columns scan up, odd columns scan back down
+    serp = np.where(col & 1, Ny - row_in_col, row_in_col)
+
+    # Cached arrays are shared across calls; freeze them
+    col.flags.writeable = False
+    serp.flags.writeable = False
+    return col, serp
+
+
 def get_voltage_array(Vx_min, Vx_max, Vy_min, Vy_max, Vx_step, Vy_step):
     
     '''
@@ -23,29 +54,22 @@ def get_voltage_array(Vx_min, Vx_max, Vy_min, Vy_max, Vx_step, Vy_step):
     :Vy_step: Float value. Amount to increment the applied Y voltage within each scan column.
 
     :returns:
-    :voltage_array: (2 x n) Numpy array. Contains arrays of the X voltages -- voltage_array[0, :] -- 
-                    and Y voltages -- voltage_array[1, :] -- to apply to the mirror controller. The dimension n depends on input params. 
+    :Vx: 1D Numpy array. X voltages to apply to the mirror controller, in scan order. Contiguous in memory.
+    :Vy: 1D Numpy array. Y voltages to apply to the mirror controller, in scan order. Contiguous in memory.
+                         The length of both arrays depends on input params. Callers that need the old
+                         (2 x n) block layout can np.vstack((Vx, Vy)).
     '''
     
     # Calculate number of discrete voltages in each channel
     Nx = int((Vx_max-Vx_min)/Vx_step)  # number of scan columns
     Ny = int((Vy_max-Vy_min)/Vy_step)  # number of discrete y voltages per column
 
-    # Initialize arrays with minimum (starting) values
-    Vx = np.full((Nx+1)*(Ny+1), Vx_min)
-    Vy = np.full((Nx+1)*(Ny+1), Vy_min)
+    # Index pattern only depends on the grid shape and is memoized
+    col, serp = _scan_indices(Nx, Ny)
 
-    # Define indexing template for Y channel
-    y_template = np.array([i for i in range(Ny+1)], dtype='uint8')
-    for i in range(0, Ny+1):
-        y_template = np.append(y_template, Ny-i)
-    
-    # Iteratively define each voltage array
-    for i in range((Nx+1)*(Ny+1)):
-        Vx[i] = Vx[i]+Vx_step*np.floor(i/(Ny+1))
-        Vy[i] = Vy[i]+Vy_step*(y_template[int(i%len(y_template))])
-    
-    
-    voltage_array = np.array([Vx, Vy])
-        
-    return voltage_array
+    # Cast once and scale to voltages; each channel is its own contiguous
+    # buffer so the DAQ streams one channel at a time
+    Vx = Vx_min + Vx_step*col.astype(np.float32)
+    Vy = Vy_min + Vy_step*serp.astype(np.float32)
+
+    return Vx, Vy
@@ -7,7 +7,7 @@ This script analyzes files output by the raster scanning procedure
 to identify the optimal voltages to apply to the steering mirror 
 to align the laser beam with the nanotip.
 '''
-from scan_analysis import load_data, model, fit_scan_data, find_alignment_voltages
+from scan_analysis import load_data_min, model, fit_scan_data, find_alignment_voltages
 from visualizers import plot_raw3D, plot_fit_model3D, plot_tip_location
 
 
@@ -37,8 +37,8 @@ def main():
 
 #########################################
 
-    # Load and extract scan data 
-    indices, Vx_out, Vy_out, time, power_mW, X_pos, Y_pos = load_data(path)
+    # Load and extract scan data (only the columns the fit uses)
+    Vx_out, Vy_out, power_mW = load_data_min(path)
 
     # Optimize parameters to fit scan data
     params, residuals, fit, xgrid, ygrid = fit_scan_data(model, Vx_out, Vy_out, power_mW, 
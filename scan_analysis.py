@@ -13,7 +13,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib import cm
 import scipy as sc
-from skimage import feature
+from numba import njit, prange
 
 
 def load_data(path):
@@ -24,27 +24,98 @@ def load_data(path):
     path: string. Path to the csv file containing the scan data
 
     :returns:
-    indices: 1D np.array. Unifying indices for all measured quantities
-    Vx_out: 1D np.array.  channel voltages applied to steering mirror during scan, in order 
-    Vy_out: 1D np.array. Y channel voltages applied to steering mirror during scan, in order 
+    indices: None. Kept for backward compatibility; the row index column is no longer parsed
+    Vx_out: 1D np.array.  channel voltages applied to steering mirror during scan, in order
+    Vy_out: 1D np.array. Y channel voltages applied to steering mirror during scan, in order
     time: 1D np.array. Time (ms) measured at each applied voltage pair and measured power
     power_mW: 1D np.array. Power (mW) measured by sensor for each pair of applied steering voltages
     X_pos: 1D np.array. X positions measured by sensor for each pair of applied steering voltages
     Y_pos:  1D np.array. Y positions measured by sensor for each pair of applied steering voltages
-    
+
+    '''
+    # Column 0 is just the row index; skip parsing it. float32 is plenty for the DAQ data
+    scan = np.loadtxt(path, dtype = np.float32, skiprows = 22, usecols = (1, 2, 3, 4, 5, 6))
+
+    # Rescale columns in place
+    scan[:, 2] -= scan[0, 2] #Calculate time in experiment.
+    scan[:, 3] *= 10**3 # Convert from W to mW
+    scan[:, 4] *= 10**(-3) # Convert to easier (arbitrary) units
+    scan[:, 5] *= 10**(-3)
+
+    # Extract data from scan file; copy each field out of the strided block
+    # so every returned array is contiguous
+    Vx_out = np.ascontiguousarray(scan[:, 0])
+    Vy_out = np.ascontiguousarray(scan[:, 1])
+    time = np.ascontiguousarray(scan[:, 2])
+    power_mW = np.ascontiguousarray(scan[:, 3])
+    X_pos = np.ascontiguousarray(scan[:, 4])
+    Y_pos = np.ascontiguousarray(scan[:, 5])
+
+    return None, Vx_out, Vy_out, time, power_mW, X_pos, Y_pos
+
+def load_data_min(path):
+    '''
+    Loads only the columns the alignment pipeline needs. The fitting in
+    main.py never touches the time or sensor position columns, so this
+    skips parsing and allocating them entirely.
+
+    :params:
+    path: string. Path to the csv file containing the scan data
+
+    :returns:
+    Vx_out: 1D np.array. X channel voltages applied to steering mirror during scan, in order
+    Vy_out: 1D np.array. Y channel voltages applied to steering mirror during scan, in order
+    power_mW: 1D np.array. Power (mW) measured by sensor for each pair of applied steering voltages
+
     '''
-    scan = np.loadtxt(path, dtype = float, skiprows = 22)
+    scan = np.loadtxt(path, dtype = np.float32, skiprows = 22, usecols = (1, 2, 4))
+    scan[:, 2] *= 10**3 # Convert from W to mW
 
-    # Extract data from scan file
-    indices = scan[:, 0]
-    Vx_out = scan[:, 1]
-    Vy_out = scan[:, 2]
-    time = scan[:, 3]-scan[0, 3] #Calculate time in experiment.
-    power_mW = scan[:, 4]*(10**3) # Convert from W to mW
-    X_pos = scan[:, 5]*10**(-3) # Convert to easier (arbitrary) units
-    Y_pos = scan[:, 6]*10**(-3)
+    Vx_out = np.ascontiguousarray(scan[:, 0])
+    Vy_out = np.ascontiguousarray(scan[:, 1])
+    power_mW = np.ascontiguousarray(scan[:, 2])
+
+    return Vx_out, Vy_out, power_mW
+
+@njit(fastmath=True, parallel=True)
+def _model_kernel(X, Y, alpha, a, beta, b, delta, d, const):
+    '''
+    Compiled model kernel. X and Y are 2D arrays whose axes are either
+    full length or length 1 (sparse grid axes); length-1 axes broadcast.
+
+    :params:
+    X: 2D np.array. X channel voltages
+    Y: 2D np.array. Y channel voltages
+    alpha, a, beta, b, delta, d, const: model parameters
+
+    :returns:
+    out: 2D np.array. Modeled power at each (X, Y) point
+    '''
+    n0 = max(X.shape[0], Y.shape[0])
+    n1 = max(X.shape[1], Y.shape[1])
+
+    # 0/1 index multipliers pin length-1 (broadcast) axes to index 0
+    xi0 = 1 if X.shape[0] > 1 else 0
+    xi1 = 1 if X.shape[1] > 1 else 0
+    yi0 = 1 if Y.shape[0] > 1 else 0
+    yi1 = 1 if Y.shape[1] > 1 else 0
+
+    out = np.empty((n0, n1), np.float32)
+    for i in prange(n0):
+        for j in range(n1):
+            x = X[i*xi0, j*xi1]
+            y = Y[i*yi0, j*yi1]
+
+            # amplitude and sd vary linearly with distance from tip
+            amp = alpha*x+a
+            sigma = beta*x+b
+
+            # make piecewise; branchless max keeps the loop vectorizable
+            amp = max(amp, 0.0)
+
+            out[i, j] = const - abs(amp*np.exp(-(y-d)**2/(2*sigma*sigma)))
+    return out
 
-    return indices, Vx_out, Vy_out, time, power_mW, X_pos, Y_pos
 
 def model(data, alpha, a, beta, b, delta, d, const):
     '''
@@ -57,19 +128,61 @@ def model(data, alpha, a, beta, b, delta, d, const):
     :returns:
     fit: 2D np.array. High resolutionn modeled power values
     '''
-    # amplitude and sd vary linearly with distance from tip
-    X = data[0]
-    Y = data[1]
-    Amp = alpha*X+a
-    sigma = beta*X+b
-    D = delta*X+d 
-    
-    # make piecewise
-    Amp[Amp<0]=0
-    fit = const - np.abs(Amp*np.exp(-(Y-d)**2/(2*sigma**2)))
+    # float32 halves memory traffic; the voltages and powers only carry
+    # ~3 significant figures to begin with
+    X = np.ascontiguousarray(np.atleast_2d(data[0]), dtype=np.float32)
+    Y = np.ascontiguousarray(np.atleast_2d(data[1]), dtype=np.float32)
+    fit = _model_kernel(X, Y, alpha, a, beta, b, delta, d, const)
+
+    # 1D voltage traces (the fitting path) come back as 1D
+    if np.ndim(data[0]) == 1 and np.ndim(data[1]) == 1:
+        return fit.ravel()
     return fit
 
 
+@njit(fastmath=True, parallel=True)
+def _model_jacobian(X, Y, alpha, a, beta, b, delta, d, const):
+    '''
+    Analytic Jacobian of model with respect to its seven parameters,
+    evaluated on 1D voltage traces. Every partial of the Gaussian shares
+    the same exponential factor, so all columns come from a single pass.
+
+    :params:
+    X: 1D np.array. X channel voltages
+    Y: 1D np.array. Y channel voltages
+    alpha, a, beta, b, delta, d, const: model parameters
+
+    :returns:
+    J: 2D np.array (n x 7). Partial derivatives of the model at each point
+    '''
+    n = X.shape[0]
+    J = np.empty((n, 7))
+    for i in prange(n):
+        x = X[i]
+        y = Y[i]
+        amp = alpha*x+a
+        sigma = beta*x+b
+        u = (y-d)/sigma
+        E = np.exp(-0.5*u*u)
+
+        # amplitude enters linearly; partials vanish where the clamp is active
+        if amp > 0:
+            J[i, 0] = -x*E
+            J[i, 1] = -E
+        else:
+            amp = 0.0
+            J[i, 0] = 0.0
+            J[i, 1] = 0.0
+
+        gE = amp*E
+        J[i, 2] = -gE*u*u/sigma*x # through sigma
+        J[i, 3] = -gE*u*u/sigma
+        J[i, 4] = 0.0 # delta does not enter the model
+        J[i, 5] = -gE*u/sigma
+        J[i, 6] = 1.0
+    return J
+
+
 def fit_scan_data(model, Vx_out, Vy_out, power, Vx_min, Vx_max, Vy_min, Vy_max):
     '''
     Optimizes parameters to fit the scan data to the model by 
@@ -82,22 +195,65 @@ def fit_scan_data(model, Vx_out, Vy_out, power, Vx_min, Vx_max, Vy_min, Vy_max):
     
     :returns:
     params: 1D np.array. Optimized fit parameters
-    residuals: 2D np.array. Matrix of residuals
+    residuals: 1D np.array. Residuals of the fit at each scan point
     fit: 2D np.array. Fitted model of scan data
     '''
 
-    # Create grid for plotting fit
+    # Create grid for plotting fit; sparse axes broadcast to the full grid in model
     n = 10*int(np.sqrt(len(Vx_out)))
-    xg = np.linspace(Vx_min, Vx_max+1, n)
-    yg = np.linspace(Vy_min, Vy_max+1, n)
-    xgrid, ygrid = np.meshgrid(xg, yg)
-
-    # Linear fitting
-    params, residuals = sc.optimize.curve_fit(model, [Vx_out, Vy_out], power, 
-                                             maxfev=100000, p0=[0.1, 2.0, 0.1, 2.25, 0.0, 8, 5.8])
-    fit = model([xgrid, ygrid], *params)
+    xg = np.linspace(Vx_min, Vx_max+1, n, dtype=np.float32)
+    yg = np.linspace(Vy_min, Vy_max+1, n, dtype=np.float32)
+    xgrid, ygrid = np.meshgrid(xg, yg, sparse=True)
+
+    # Non-linear least squares with the analytic Jacobian: each iteration
+    # costs one model and one Jacobian evaluation instead of the extra model
+    # calls curve_fit spends on finite differences
+    X = np.ascontiguousarray(Vx_out, dtype=np.float64)
+    Y = np.ascontiguousarray(Vy_out, dtype=np.float64)
+
+    def residual(p):
+        return model([X, Y], *p) - power
+
+    def jacobian(p):
+        return _model_jacobian(X, Y, *p)
+
+    result = sc.optimize.least_squares(residual, x0=[0.1, 2.0, 0.1, 2.25, 0.0, 8, 5.8],
+                                       jac=jacobian, method='lm', max_nfev=100000)
+    params = result.x
+    residuals = result.fun
+
+    # Evaluate the fitted surface in row strips into one preallocated buffer
+    # so per-strip working sets stay cache resident on large grids
+    TILE = 4096 # rows per strip
+    fit = np.empty((n, n), np.float32)
+    for y0 in range(0, n, TILE):
+        fit[y0:y0+TILE] = model([xgrid, ygrid[y0:y0+TILE]], *params)
+
+    # Dense grids are only needed downstream for plotting; expand views once here
+    xgrid, ygrid = np.broadcast_arrays(xgrid, ygrid)
     return params, residuals, fit, xgrid, ygrid
 
+@njit(parallel=True, fastmath=True)
+def _threshold(fit, bottom, top):
+    '''
+    Compiled single-pass threshold-band kernel.
+
+    :params:
+    fit: 2D np.array. Fitted model of scan data
+    bottom: float. lower edge of the threshold band
+    top: float. upper edge of the threshold band
+
+    :returns:
+    out: 2D np.array (bool). True where fit lies inside the band
+    '''
+    out = np.empty(fit.shape, np.bool_)
+    for i in prange(fit.shape[0]):
+        for j in range(fit.shape[1]):
+            v = fit[i, j]
+            out[i, j] = (v >= bottom) & (v <= top)
+    return out
+
+
 def find_alignment_voltages(fit, Vx_min, Vx_max, Vy_min, Vy_max, params):
     '''
     Finds the optimal voltages to align laser beam with nanotip.
@@ -121,25 +277,25 @@ def find_alignment_voltages(fit, Vx_min, Vx_max, Vy_min, Vy_max, params):
     H = 0.05 # Threshold signal
     const = params[6] # Baseline signal
 
-    keypoints_grid = np.zeros(fit.shape)
     bottom = const - H*const
     top = const - (H-0.01)*const
 
-    for i_j, el in np.ndenumerate(fit):
-        if el >= bottom and el <= top:
-            keypoints_grid[i_j] = 1
-    
-    local_max_cords = feature.peak_local_max(keypoints_grid, min_distance=1)
-    xs = local_max_cords[:, 1]
-    ys = local_max_cords[:, 0]
-
-    # Average the positions of the 5 leftmost points
-    sorted_indices = np.argsort(xs)
-    leftmost_indices = sorted_indices[0:5]
-    xleftmost_values = np.array([xs[el] for el in leftmost_indices])
-    yleftmost_values = np.array([ys[el] for el in leftmost_indices])
-    tip_x = np.mean(xleftmost_values)
-    tip_y = np.mean(yleftmost_values)
+    # Mark every pixel whose predicted power falls inside the threshold band
+    keypoints_grid = _threshold(fit, bottom, top)
+
+
+    # Every in-band pixel is its own local maximum on a binary grid, so
+    # peak_local_max(min_distance=1) reduced to np.nonzero minus the
+    # one-pixel border its exclude_border default dropped; keep that crop
+    ys, xs = np.nonzero(keypoints_grid[1:-1, 1:-1])
+    ys += 1
+    xs += 1
+
+    # Average the positions of the 5 leftmost points; O(N) selection
+    # instead of a full sort of the keypoint coordinates
+    leftmost_indices = np.argpartition(xs, min(4, xs.size-1))[:5]
+    tip_x = np.mean(xs[leftmost_indices])
+    tip_y = np.mean(ys[leftmost_indices])
 
     
     
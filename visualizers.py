@@ -90,13 +90,14 @@ def plot_tip_location(fit, xs, ys, tip_x, tip_x_inVolts, tip_y, tip_y_inVolts,
     none
     '''
 
-    num_xticks = (Vx_max-Vx_min)/5 +1
-    num_yticks = (Vy_max-Vy_min)/5 +1
+    # One tick every 5 V; counts must be ints for linspace
+    num_xticks = int(Vx_max-Vx_min)//5 + 1
+    num_yticks = int(Vy_max-Vy_min)//5 + 1
     xticks = np.linspace(0, fit.shape[1], num_xticks)
     yticks = np.linspace(0, fit.shape[0], num_yticks)
-    
-    xlabels = np.arange(Vx_min, Vx_max+1, num_xticks)
-    ylabels = np.arange(Vy_min, Vy_max+1, num_yticks)
+
+    xlabels = np.linspace(Vx_min, Vx_max, num_xticks)
+    ylabels = np.linspace(Vy_min, Vy_max, num_yticks)
     plt.xticks(xticks, xlabels)
     plt.yticks(yticks, ylabels)
     